@@ -1,13 +1,15 @@
+import asyncio
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import redis
+import redis.asyncio as aioredis
 import json
 import os
 import time
 import logging
-import uuid
-import hashlib
+import msgpack
 from datetime import datetime, timedelta
 from api.validators import VitalsReading
 from contextlib import asynccontextmanager
@@ -21,28 +23,125 @@ logger = logging.getLogger("physio-api")
 # Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 STREAM_KEY = "vitals_stream"
+STREAM_MAXLEN = 100000 # Approximate cap so the stream can't eat Redis memory
 
-# Redis Client
-r = redis.from_url(REDIS_URL, decode_responses=True)
+# Redis Client (async - sync client would block the event loop per command).
+# hiredis (in requirements) moves RESP parsing into C; the connection pool
+# is capped so bursts reuse sockets instead of opening one per request.
+# Point REDIS_URL at unix:///... when colocated to skip the TCP stack.
+r = aioredis.from_url(REDIS_URL, decode_responses=True, max_connections=64)
+
+# Sliding-window rate limiter, executed atomically server-side.
+# One round trip, no INCR/EXPIRE race, and a denied request does not
+# grow the window (early exit before ZADD).
+RATE_LIMIT_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window_ms)
+-- ZCARD, not ZRANGE: the decision only needs the count, so the reply
+-- stays a single integer regardless of how full the window is.
+local count = redis.call('ZCARD', key)
+if count >= limit then
+    return 0
+end
+redis.call('ZADD', key, now, ARGV[4])
+redis.call('PEXPIRE', key, window_ms)
+return 1
+"""
+rate_limit_sha = None
+
+# Batched Postgres writer.
+# Per-request INSERTs pay a round trip + WAL fsync per event; queueing and
+# flushing every few ms amortizes that across the whole batch.
+FLUSH_MAX_ROWS = 500
+FLUSH_INTERVAL_S = 0.01
+INGEST_QUEUE_MAX = 10000
+
+ingest_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_QUEUE_MAX)
+
+INSERT_PATIENT_SQL = "INSERT INTO patients (id) VALUES (%s) ON CONFLICT (id) DO NOTHING"
+INSERT_VITALS_SQL = """
+    INSERT INTO vitals_events
+    (patient_id, timestamp, hr, bp_sys, bp_dia, spo2, rr, temp)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (patient_id, timestamp) DO NOTHING
+"""
+
+async def _flush_rows(rows):
+    # Patients first (FK), deduped within the batch.
+    patient_ids = sorted({(row[0],) for row in rows})
+    try:
+        async with pool.connection() as conn:
+            # libpq pipeline mode: both statements go out back-to-back in
+            # one round trip instead of waiting on the first's result.
+            async with conn.pipeline():
+                async with conn.cursor() as cur:
+                    await cur.executemany(INSERT_PATIENT_SQL, patient_ids)
+                    await cur.executemany(INSERT_VITALS_SQL, rows)
+    except psycopg.Error as e:
+        print(f"DB Error (batch flush, {len(rows)} rows): {e}")
+
+async def ingest_flusher():
+    """Drain the ingest queue in batches of FLUSH_MAX_ROWS / FLUSH_INTERVAL_S."""
+    loop = asyncio.get_running_loop()
+    while True:
+        rows = [await ingest_queue.get()]
+        deadline = loop.time() + FLUSH_INTERVAL_S
+        try:
+            while len(rows) < FLUSH_MAX_ROWS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(ingest_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Shutdown can land mid-batch: these rows are already dequeued
+            # and 202-acknowledged, and the lifespan drain only sees what
+            # is still in the queue - flush them before exiting.
+            await asyncio.shield(_flush_rows(rows))
+            raise
+        await _flush_rows(rows)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global rate_limit_sha
     # Startup: Verify Redis connection & Open DB Pool
     try:
-        r.ping()
+        await r.ping()
+        rate_limit_sha = await r.script_load(RATE_LIMIT_SCRIPT)
         print(f"Connected to Redis at {REDIS_URL}")
     except redis.ConnectionError:
         print(f"Failed to connect to Redis at {REDIS_URL}")
-    
+
     await pool.open()
+    # Block until min_size connections are established so the first
+    # requests don't eat the connect cost.
+    await pool.wait()
     print("Database pool opened.")
 
+    flusher_task = asyncio.create_task(ingest_flusher())
+
     yield
-    # Shutdown
+    # Shutdown: stop the flusher, then write out anything still queued.
+    flusher_task.cancel()
+    try:
+        await flusher_task
+    except asyncio.CancelledError:
+        pass
+    remaining = []
+    while not ingest_queue.empty():
+        remaining.append(ingest_queue.get_nowait())
+    if remaining:
+        await _flush_rows(remaining)
     await pool.close()
-    r.close()
+    await r.close()
 
-app = FastAPI(title="Physio Engine API", lifespan=lifespan)
+app = FastAPI(title="Physio Engine API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS (Allow UI access)
 app.add_middleware(
@@ -64,7 +163,9 @@ app.mount("/ui", StaticFiles(directory="ui", html=True), name="ui")
 # Middleware for Timing
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    request_id = str(uuid.uuid4())
+    # Tracing id, not an external identifier: pid + monotonic ns is unique
+    # across workers and skips uuid4's per-request entropy syscall.
+    request_id = f"{os.getpid():x}-{time.monotonic_ns():x}"
     request.state.request_id = request_id
     start_time = time.perf_counter()
     
@@ -81,24 +182,37 @@ async def add_process_time_header(request: Request, call_next):
 # Helpers
 def get_idempotency_key(reading: VitalsReading) -> str:
     """Generate a unique key for the event to prevent duplicates."""
-    # Composite key: Patient + Timestamp usually sufficient.
-    # We use a hash to be safe and clean.
-    raw = f"{reading.patient_id}:{reading.timestamp.isoformat()}"
-    return hashlib.sha256(raw.encode()).hexdigest()
+    # Composite key: Patient + Timestamp is already unique and short;
+    # hashing it (previously sha256) bought nothing but CPU. Redis key
+    # length is not a bottleneck at ~60 bytes.
+    return f"{reading.patient_id}:{reading.timestamp.isoformat()}"
 
 # Middleware / Dependency for Rate Limiting
 # simple sliding window or fixed window limiter per patient?
 # For now, let's just do a global limiter or per-IP. 
 # Prompt requires "Enforce rate limiting".
 # We'll limit by patient_id to prevent flooding for a single patient.
-def check_rate_limit(patient_id: str):
+async def check_rate_limit(patient_id: str):
+    global rate_limit_sha
     key = f"rate_limit:{patient_id}"
-    # Allow 10 requests per 10 seconds per patient
-    current = r.incr(key)
-    if current == 1:
-        r.expire(key, 10)
-    
-    if current > 20: 
+    # Allow 20 requests per 10 seconds per patient (sliding window).
+    now_ms = int(time.time() * 1000)
+    # Member must be unique per request, including across worker processes
+    # sharing the same Redis, or concurrent ZADDs would collapse into one.
+    member = f"{now_ms}:{os.getpid()}:{time.monotonic_ns()}"
+    args = (1, key, now_ms, 10000, 20, member)
+    try:
+        if rate_limit_sha is None:
+            # Startup load failed (Redis was down when lifespan ran):
+            # load lazily now that a command is about to need it.
+            rate_limit_sha = await r.script_load(RATE_LIMIT_SCRIPT)
+        allowed = await r.evalsha(rate_limit_sha, *args)
+    except redis.exceptions.NoScriptError:
+        # Script cache flushed (e.g. Redis restarted): reload and retry.
+        rate_limit_sha = await r.script_load(RATE_LIMIT_SCRIPT)
+        allowed = await r.eval(RATE_LIMIT_SCRIPT, *args)
+
+    if not allowed:
         raise HTTPException(status_code=429, detail="Rate limit exceeded for this patient ID")
 
 @app.post("/ingest", status_code=status.HTTP_202_ACCEPTED)
@@ -112,76 +226,64 @@ async def ingest_vitals(reading: VitalsReading, request: Request):
     - Pushes to Redis Stream.
     """
     # 1. Rate Limiting
-    check_rate_limit(reading.patient_id)
+    await check_rate_limit(reading.patient_id)
 
     # 2. Idempotency Check (Redis Cache first)
     idem_key = f"idem:{get_idempotency_key(reading)}"
-    if r.exists(idem_key):
+    if await r.exists(idem_key):
         return {"status": "ignored", "detail": "duplicate_event_cache"}
 
-    # 3. Persist to Postgres
+    # 3. Queue for batched Postgres persistence.
+    # The background flusher writes it within FLUSH_INTERVAL_S; the unique
+    # (patient_id, timestamp) constraint absorbs any replays.
+    row = (
+        reading.patient_id,
+        reading.timestamp,
+        reading.hr,
+        reading.bp_sys,
+        reading.bp_dia,
+        reading.spo2,
+        reading.rr,
+        reading.temp
+    )
     try:
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                # Ensure patient exists
-                await cur.execute(
-                    "INSERT INTO patients (id) VALUES (%s) ON CONFLICT (id) DO NOTHING",
-                    (reading.patient_id,)
-                )
-                
-                await cur.execute(
-                    """
-                    INSERT INTO vitals_events 
-                    (patient_id, timestamp, hr, bp_sys, bp_dia, spo2, rr, temp)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                    """,
-                    (
-                        reading.patient_id, 
-                        reading.timestamp, 
-                        reading.hr, 
-                        reading.bp_sys, 
-                        reading.bp_dia, 
-                        reading.spo2, 
-                        reading.rr, 
-                        reading.temp
-                    )
-                )
-                event_id = (await cur.fetchone())[0]
-    except psycopg.Error as e:
-        print(f"DB Error: {e}")
-        # In prod, log specific error. Duplicate key?
-        raise HTTPException(status_code=500, detail="Database persistence failed")
-
-    # 4. Push to Stream
-    payload = reading.model_dump()
-    payload['timestamp'] = reading.timestamp.isoformat()
-    payload['db_id'] = event_id
-    
+        ingest_queue.put_nowait(row)
+    except asyncio.QueueFull:
+        # DB can't keep up; shed load instead of buffering unbounded.
+        raise HTTPException(status_code=503, detail="Ingest backlog full")
+
+    # 4. Push to Stream.
+    # mode='json' emits the ISO timestamp directly from pydantic's core -
+    # no Python-side isoformat() and no second pass over the dict.
+    payload = reading.model_dump(mode='json')
+
     try:
-        msg_id = r.xadd(STREAM_KEY, payload)
-        
-        # 5. Set Idempotency Key
-        r.setex(idem_key, 600, "1")
-        
+        # Single msgpack blob per entry instead of one Redis field per
+        # vital - fewer listpack entries, smaller memory, one decode
+        # downstream. XADD + idempotency marker in one pipelined RTT.
+        blob = msgpack.packb(payload, use_bin_type=True)
+        pipe = r.pipeline(transaction=False)
+        pipe.xadd(STREAM_KEY, {"d": blob}, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.setex(idem_key, 600, "1")
+        msg_id, _ = await pipe.execute()
+
         # Log Success Latency specifically for metrics parsing
         # We can't easily get full time here inside function, relying on middleware for total time.
         # But user asked for "ingest_latency_ms=<value>" in logs. Middleware does this.
         # We can add specific log for ingest success.
         logger.info(f"request_id={request.state.request_id} event=ingest_success patient_id={reading.patient_id}")
 
-        return {"status": "queued", "id": msg_id, "db_id": event_id}
+        return {"status": "queued", "id": msg_id}
     except redis.RedisError:
-        # DB inserted but Redis failed. 
+        # Row queued for DB but Redis failed.
         # This is a partial failure state.
-        # We could delete from DB here to rollback, 
-        # but better to have ingestion idempotency handle it on retry.
+        # Ingestion idempotency handles it on client retry.
         raise HTTPException(status_code=503, detail="Stream service unavailable")
 
 @app.get("/health")
 async def health_check():
     try:
-        r.ping()
+        await r.ping()
         redis_status = "connected"
     except:
         redis_status = "disconnected"
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, field_validator
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from datetime import datetime, timezone
+import time
 
 class VitalsReading(BaseModel):
     patient_id: str = Field(..., min_length=1, max_length=50, description="Unique patient identifier")
@@ -12,31 +12,19 @@ class VitalsReading(BaseModel):
     rr: int = Field(..., ge=4, le=60, description="Respiratory Rate (breaths/min)")
     temp: float = Field(..., ge=30.0, le=45.0, description="Body Temperature (C)")
 
-    @field_validator('timestamp')
-    def timestamp_not_future(cls, v: datetime):
-        # Ensure v is timezone-aware or normalize to UTC
-        if v.tzinfo is None:
-             # Assume UTC if naive, or reject. Let's assume input is UTC.
-             v = v.replace(tzinfo=None) # Compare naive-to-naive or aware-to-aware
-             current = datetime.utcnow()
-        else:
-             current = datetime.now(v.tzinfo)
+    @model_validator(mode='after')
+    def timestamp_not_future(self):
+        # Single epoch comparison instead of datetime construction per request.
+        # Naive timestamps are assumed UTC.
+        ts = self.timestamp
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        if ts.timestamp() - time.time() > 300: # 5 min future tolerance
+            raise ValueError('Timestamp cannot be significantly in the future')
+        return self
 
-        if v > current:
-            # Allow a small clock skew (e.g. 5 seconds) if needed, but strictly reject future
-            # For now, simplistic check:
-            if (v - current).total_seconds() > 300: # 5 min future tolerance
-                 raise ValueError('Timestamp cannot be significantly in the future')
-        return v
-    
-    @field_validator('bp_sys')
-    def sys_greater_than_dia(cls, v, values):
-        # We need validation context, but pydantic v2 passes ValidationInfo.
-        # This simple check might need to be a model_validator if we strictly compare fields.
-        return v
-
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "patient_id": "pt-1234",
                 "timestamp": "2023-10-27T10:00:00Z",
@@ -48,3 +36,4 @@ class VitalsReading(BaseModel):
                 "temp": 36.8
             }
         }
+    )
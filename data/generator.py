@@ -1,15 +1,14 @@
+import asyncio
 import random
 import time
-import random
-import time
+import numpy as np
 from datetime import datetime, timedelta, timezone
-import requests
-import json
-import logging
-import sys
-import requests
+import httpx
+import msgpack
+import redis.asyncio as aioredis
 import json
 import logging
+import os
 import sys
 
 # Logging
@@ -18,6 +17,8 @@ logger = logging.getLogger("generator")
 
 # Configuration
 API_URL = "http://localhost:8000/ingest"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STREAM_KEY = "vitals_stream"
 
 class PatientSimulator:
     def __init__(self, patient_id):
@@ -100,52 +101,120 @@ class PatientSimulator:
         self.anomaly_active = False
         self.anomaly_type = None
 
-def generate_training_data(n_samples=1000):
-        self.anomaly_active = False
-        self.anomaly_type = None
+# Channel order everywhere: hr, bp_sys, bp_dia, spo2, rr, temp
+BASELINES = np.array([75.0, 120.0, 80.0, 98.0, 16.0, 37.0])
+WALK_STEPS = np.array([2.0, 2.0, 1.0, 0.5, 1.0, 0.1])
+CHANNEL_LOWS = np.array([40.0, 80.0, 50.0, 85.0, 8.0, 35.5])
+CHANNEL_HIGHS = np.array([180.0, 200.0, 120.0, 100.0, 40.0, 40.0])
+
+def generate_training_data(n_samples=1000, seed=42):
+    """Generate raw samples for training.
+
+    Vectorized: one clipped random walk per channel instead of driving a
+    PatientSimulator sample-by-sample (n_samples x 6 random calls + dict
+    builds). The live simulation path keeps the per-reading simulator.
+    """
+    rng = np.random.default_rng(seed)
+    deltas = rng.uniform(-WALK_STEPS, WALK_STEPS, size=(n_samples, len(BASELINES)))
+    data = np.clip(BASELINES + np.cumsum(deltas, axis=0), CHANNEL_LOWS, CHANNEL_HIGHS)
+    labels = np.ones(n_samples) # 1 normal, -1 anomaly
+    # float32: vitals don't need double precision and it halves the bytes
+    # sklearn moves while building trees.
+    return data.astype(np.float32), labels
+
+class PatientPool:
+    """SoA simulator for many patients.
+
+    One (P, 6) state array and one vectorized random-walk update per tick,
+    so the Python cost per tick is O(1) in patient count. PatientSimulator
+    stays as the single-patient (AoS) path.
+    """
+
+    # Per-tick deterioration vectors, same channel order as BASELINES
+    DETERIORATION = {
+        "spike": np.array([2.0, 0.0, 0.0, 0.0, 0.0, 0.0]),   # Fast HR rise
+        "drop":  np.array([0.0, 0.0, 0.0, -0.5, 0.0, 0.0]),  # Slow SpO2 drop
+        "drift": np.array([0.5, -0.5, -0.3, 0.0, 0.0, 0.0]), # Shock pattern
+    }
 
-def generate_training_data(n_samples=1000):
-    """Generate raw samples for training."""
-    sim = PatientSimulator("train")
-    data = []
-    labels = [] # 1 normal, -1 anomaly
-    
-    for _ in range(n_samples):
-        # 5% chance of anomaly in training data? or pure?
-        # Isolation forest needs mostly pure.
-        reading = sim.generate_reading()
-        vector = [
-            reading['hr'],
-            reading['bp_sys'],
-            reading['bp_dia'],
-            reading['spo2'],
-            reading['rr'],
-            reading['temp']
+    def __init__(self, patients):
+        self.patient_ids = [f"p-{i}" for i in range(1, patients + 1)]
+        self.state = np.tile(BASELINES, (patients, 1))
+        self.rng = np.random.default_rng()
+        self.anomaly_type = [None] * patients
+        self.anomaly_start = [None] * patients
+
+    def start_anomaly(self, idx, type="spike"):
+        self.anomaly_type[idx] = type
+        self.anomaly_start[idx] = datetime.now(timezone.utc)
+        logger.info(f"ANOMALY_INJECTED patient_id={self.patient_ids[idx]} type={type} timestamp={self.anomaly_start[idx].isoformat()}")
+
+    def stop_anomaly(self, idx):
+        self.anomaly_type[idx] = None
+        self.anomaly_start[idx] = None
+
+    def tick(self):
+        """Advance every patient one step, return the payloads for this tick."""
+        now = datetime.now(timezone.utc)
+
+        # Random anomaly injection / recovery, mirroring the AoS simulator
+        for i, a_type in enumerate(self.anomaly_type):
+            if a_type is None and random.random() < 0.01:
+                self.start_anomaly(i, "spike" if random.random() > 0.5 else "drop")
+            elif a_type is not None and (now - self.anomaly_start[i]).total_seconds() > 20:
+                self.stop_anomaly(i)
+
+        # Normal patients: one clipped vectorized walk for the whole pool
+        normal = np.array([t is None for t in self.anomaly_type])
+        deltas = self.rng.uniform(-WALK_STEPS, WALK_STEPS, size=self.state.shape)
+        self.state[normal] = np.clip(
+            self.state[normal] + deltas[normal], CHANNEL_LOWS, CHANNEL_HIGHS
+        )
+        # Deteriorating patients: unclipped so they actually breach thresholds
+        for i, a_type in enumerate(self.anomaly_type):
+            if a_type is not None:
+                self.state[i] += self.DETERIORATION[a_type]
+
+        ts = now.isoformat()
+        return [
+            {
+                "patient_id": self.patient_ids[i],
+                "timestamp": ts,
+                "hr": int(row[0]),
+                "bp_sys": int(row[1]),
+                "bp_dia": int(row[2]),
+                "spo2": int(row[3]),
+                "rr": int(row[4]),
+                "temp": round(float(row[5]), 1)
+            }
+            for i, row in enumerate(self.state)
         ]
-        data.append(vector)
-        labels.append(1) 
-    return data, labels
 
-def run_load_test(patients=3, duration_s=60, rate_limit_sleep=1.0):
+async def run_load_test(patients=3, duration_s=60, rate_limit_sleep=1.0):
     print(f"Starting generator with {patients} patients for {duration_s}s...")
-    sims = [PatientSimulator(f"p-{i}") for i in range(1, patients + 1)]
-    
+    pool = PatientPool(patients)
+
     start_time = time.time()
     events_sent = 0
-    
+
     try:
-        while time.time() - start_time < duration_s:
-            for sim in sims:
-                # Random anomaly injection
-                if not sim.anomaly_active and random.random() < 0.01:
-                    sim.start_anomaly("spike" if random.random() > 0.5 else "drop")
-                elif sim.anomaly_active and (datetime.now(timezone.utc) - sim.anomaly_start_time).total_seconds() > 20:
-                    sim.stop_anomaly()
-                
-                data = sim.generate_reading()
-                try:
-                    resp = requests.post(API_URL, json=data, timeout=2)
-                    if resp.status_code in [200, 202]:
+        # One persistent client: connections are pooled and reused across
+        # ticks instead of a fresh TCP handshake per POST, and HTTP/2
+        # multiplexes the concurrent posts onto a shared connection.
+        limits = httpx.Limits(max_connections=64)
+        async with httpx.AsyncClient(timeout=2, http2=True, limits=limits) as client:
+            while time.time() - start_time < duration_s:
+                payloads = pool.tick()
+
+                # All patients post concurrently; one tick = one gather.
+                responses = await asyncio.gather(
+                    *[client.post(API_URL, json=data) for data in payloads],
+                    return_exceptions=True
+                )
+                for resp in responses:
+                    if isinstance(resp, Exception):
+                        print(f" Request Failed: {resp}")
+                    elif resp.status_code in [200, 202]:
                         events_sent += 1
                         if events_sent % 10 == 0:
                             sys.stdout.write(f"\rEvents sent: {events_sent}")
@@ -154,26 +223,68 @@ def run_load_test(patients=3, duration_s=60, rate_limit_sleep=1.0):
                         pass # Rate limit hit
                     else:
                         print(f" Error: {resp.status_code}")
-                except Exception as e:
-                    print(f" Request Failed: {e}")
-            
-            time.sleep(rate_limit_sleep)
-            
+
+                await asyncio.sleep(rate_limit_sleep)
+
+    except KeyboardInterrupt:
+        pass
+
+    print(f"\nTotal events successfully sent: {events_sent}")
+    return events_sent
+
+async def run_direct_load(patients=3, duration_s=60, rate_limit_sleep=1.0):
+    """Benchmark mode: bypass the API and XADD straight into the stream.
+
+    One pipelined flush per tick instead of N HTTP round trips - measures
+    worker throughput without the ingest path in front of it.
+    """
+    print(f"Starting DIRECT generator with {patients} patients for {duration_s}s...")
+    sim_pool = PatientPool(patients)
+    r = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+    start_time = time.time()
+    events_sent = 0
+
+    try:
+        while time.time() - start_time < duration_s:
+            payloads = sim_pool.tick()
+            pipe = r.pipeline(transaction=False)
+            for data in payloads:
+                # Same single-blob entry shape the API produces
+                pipe.xadd(STREAM_KEY, {"d": msgpack.packb(data, use_bin_type=True)},
+                          maxlen=100000, approximate=True)
+            await pipe.execute()
+
+            events_sent += len(payloads)
+            if events_sent % 10 == 0:
+                sys.stdout.write(f"\rEvents sent: {events_sent}")
+                sys.stdout.flush()
+
+            await asyncio.sleep(rate_limit_sleep)
     except KeyboardInterrupt:
         pass
-    
+    finally:
+        await r.close()
+
     print(f"\nTotal events successfully sent: {events_sent}")
     return events_sent
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "train":
+    args = sys.argv[1:]
+    if args and args[0] == "train":
         pass # Imported by train.py
     else:
+        direct = "--direct" in args
+        if direct:
+            args.remove("--direct")
         # Default run
         duration = 60
-        if len(sys.argv) > 1:
+        if args:
             try:
-                duration = int(sys.argv[1])
+                duration = int(args[0])
             except: pass
-        
-        run_load_test(duration_s=duration)
+
+        if direct:
+            asyncio.run(run_direct_load(duration_s=duration))
+        else:
+            asyncio.run(run_load_test(duration_s=duration))
@@ -0,0 +1,12 @@
+-- Read-path indexes for /patient/{id} and /anomalies.
+--
+-- Fresh installs get these from schema.sql; this migration exists for
+-- databases created before the indexes were part of the schema.
+-- CONCURRENTLY avoids locking out the ingest flusher; run outside a
+-- transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vitals_patient_time
+    ON vitals_events(patient_id, timestamp DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_anomalies_active
+    ON anomalies(timestamp DESC);
@@ -24,7 +24,9 @@ CREATE TABLE IF NOT EXISTS vitals_events (
     CONSTRAINT uniq_patient_time UNIQUE (patient_id, timestamp)
 );
 
-CREATE INDEX idx_vitals_patient_time ON vitals_events(patient_id, timestamp DESC);
+-- Composite (patient_id, timestamp DESC): turns the ORDER BY ... DESC
+-- LIMIT 1 latest-vitals lookup into a reverse index scan.
+CREATE INDEX IF NOT EXISTS idx_vitals_patient_time ON vitals_events(patient_id, timestamp DESC);
 
 -- Window Summaries (Persisted state of sliding windows)
 CREATE TABLE IF NOT EXISTS windows (
@@ -39,7 +41,7 @@ CREATE TABLE IF NOT EXISTS windows (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_windows_patient_time ON windows(patient_id, end_time DESC);
+CREATE INDEX IF NOT EXISTS idx_windows_patient_time ON windows(patient_id, end_time DESC);
 
 -- Anomalies
 CREATE TABLE IF NOT EXISTS anomalies (
@@ -52,5 +54,5 @@ CREATE TABLE IF NOT EXISTS anomalies (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE INDEX idx_anomalies_active ON anomalies(timestamp DESC);
-CREATE INDEX idx_anomalies_patient ON anomalies(patient_id);
+CREATE INDEX IF NOT EXISTS idx_anomalies_active ON anomalies(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_anomalies_patient ON anomalies(patient_id);
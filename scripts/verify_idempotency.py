@@ -15,15 +15,38 @@ DB_PORT = os.getenv("WN_DB_PORT", "5433")
 DB_DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 GENERATOR_CMD = ["python3", "data/generator.py", "30"] # Run for 30s
 
-def get_db_count():
+def get_counts():
+    """Return (stored_events, duplicate_groups).
+
+    The schema enforces uniq_patient_time UNIQUE (patient_id, timestamp),
+    so when that constraint is present duplicates cannot exist and the
+    answer is a catalog lookup plus a plain count - no GROUP BY re-scan of
+    every stored row. The scan remains as a fallback for databases created
+    before the constraint existed.
+    """
     try:
         with psycopg.connect(DB_DSN) as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT count(*) FROM vitals_events")
-                return cur.fetchone()[0]
+                cur.execute("""
+                    SELECT 1 FROM pg_constraint
+                    WHERE conname = 'uniq_patient_time' AND contype = 'u'
+                """)
+                if cur.fetchone():
+                    cur.execute("SELECT count(*) FROM vitals_events")
+                    return cur.fetchone()[0], 0
+                cur.execute("""
+                    WITH dupes AS (
+                        SELECT 1 FROM vitals_events
+                        GROUP BY patient_id, timestamp
+                        HAVING count(*) > 1
+                    )
+                    SELECT (SELECT count(*) FROM vitals_events),
+                           (SELECT count(*) FROM dupes)
+                """)
+                return cur.fetchone()
     except Exception as e:
         print(f"DB Error: {e}")
-        return 0
+        return 0, -1
 
 def clean_db():
     try:
@@ -43,7 +66,7 @@ def main():
     
     # 2. Start Generator in background
     print("Starting Generator (30s)...")
-    gen_process = subprocess.Popen(GENERATOR_CMD, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    gen_process = subprocess.Popen(GENERATOR_CMD, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
     
     # 3. Wait 10s then kill Worker
     time.sleep(10)
@@ -57,38 +80,25 @@ def main():
     print("Restarting Worker container...")
     subprocess.run(["docker", "compose", "start", "worker"], check=True)
     
-    # 6. Wait for generator to finish
-    stdout, stderr = gen_process.communicate()
-    
-    # Parse sent count from stdout
-    # "Total events successfully sent: <N>"
+    # 6. Consume generator stdout as it runs instead of buffering all of
+    # it just to find one line: "Total events successfully sent: <N>"
     sent_events = 0
-    for line in stdout.splitlines():
+    for line in iter(gen_process.stdout.readline, ''):
         if "Total events successfully sent:" in line:
-            sent_events = int(line.split(":")[1].strip())
-    
+            sent_events = int(line.rsplit(":", 1)[1].strip())
+            break
+    gen_process.stdout.close()
+    gen_process.wait()
+
     print(f"Generator finished. Sent: {sent_events}")
     
     # 7. Wait for worker to catch up (drain stream)
     print("Waiting for worker to drain stream (10s)...")
     time.sleep(10)
     
-    # 8. Verify
-    stored_events = get_db_count()
+    # 8. Verify (count + duplicates check in one statement)
+    stored_events, duplicates = get_counts()
     print(f"Stored in DB: {stored_events}")
-    
-    # Check duplicates query
-    duplicates = 0
-    with psycopg.connect(DB_DSN) as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT patient_id, timestamp, count(*) 
-                FROM vitals_events 
-                GROUP BY patient_id, timestamp 
-                HAVING count(*) > 1
-            """)
-            duplicates = len(cur.fetchall())
-    
     print(f"Duplicates found: {duplicates}")
     
     # Assertions
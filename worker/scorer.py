@@ -0,0 +1,74 @@
+import numpy as np
+
+_EULER_GAMMA = 0.5772156649015329
+
+def _average_path_length(n_samples):
+    """Average unsuccessful-search path length in a BST of n samples.
+
+    Same formula sklearn uses to terminate isolation-tree paths at
+    non-singleton leaves.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    apl = np.zeros_like(n)
+    apl[n == 2] = 1.0
+    gt = n > 2
+    ng = n[gt]
+    apl[gt] = 2.0 * (np.log(ng - 1.0) + _EULER_GAMMA) - 2.0 * (ng - 1.0) / ng
+    return apl
+
+class IForestScorer:
+    """decision_function for a fitted IsolationForest without sklearn overhead.
+
+    sklearn's predict/decision_function path re-runs check_array and
+    per-estimator dispatch on every call, which dominates for the worker's
+    tiny micro-batches. Extract each tree's node arrays once at load time
+    and traverse them with vectorized index chasing; scores match
+    model.decision_function. The constructor scores a dummy row so the
+    first real event doesn't pay any lazy-allocation cost.
+    """
+
+    def __init__(self, model):
+        self._trees = []
+        for est, feats in zip(model.estimators_, model.estimators_features_):
+            t = est.tree_
+            self._trees.append((
+                np.asarray(feats),
+                t.feature.copy(),
+                t.threshold.copy(),
+                t.children_left.copy(),
+                t.children_right.copy(),
+                t.n_node_samples.copy(),
+            ))
+        self._denominator = (
+            len(self._trees) * float(_average_path_length([model.max_samples_])[0])
+        )
+        self._offset = float(model.offset_)
+        # Prewarm
+        self.decision_function(np.zeros((1, model.n_features_in_), dtype=np.float32))
+
+    @staticmethod
+    def _tree_depths(X, feature, threshold, cleft, cright, n_node_samples):
+        n = X.shape[0]
+        node = np.zeros(n, dtype=np.intp)
+        depth = np.zeros(n, dtype=np.float64)
+        active = cleft[node] != -1 # Leaves have children_left == -1
+        while active.any():
+            idx = np.nonzero(active)[0]
+            cur = node[idx]
+            go_left = X[idx, feature[cur]] <= threshold[cur]
+            node[idx] = np.where(go_left, cleft[cur], cright[cur])
+            depth[idx] += 1.0
+            active[idx] = cleft[node[idx]] != -1
+        # Terminated paths continue virtually through the leaf's samples
+        return depth + _average_path_length(n_node_samples[node])
+
+    def decision_function(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        depths = np.zeros(X.shape[0], dtype=np.float64)
+        for feats, feature, threshold, cleft, cright, n_node_samples in self._trees:
+            depths += self._tree_depths(
+                X[:, feats], feature, threshold, cleft, cright, n_node_samples
+            )
+        scores = 2.0 ** (-depths / self._denominator)
+        # score_samples = -scores; decision_function = score_samples - offset
+        return -scores - self._offset
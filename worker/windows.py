@@ -1,58 +1,109 @@
-from collections import deque
 from datetime import datetime
 import numpy as np
 
-class SlidingWindow:
-    def __init__(self, size_seconds):
-        self.size_seconds = size_seconds
-        self.events = deque() # List of (timestamp, value_dict)
-    
-    def add_event(self, timestamp: datetime, data: dict):
-        self.events.append((timestamp, data))
-        self._prune(timestamp)
-        
-    def _prune(self, current_time: datetime):
-        cutoff = current_time.timestamp() - self.size_seconds
-        while self.events and self.events[0][0].timestamp() < cutoff:
-            self.events.popleft()
-            
-    def get_aggregates(self):
-        if not self.events:
+# Column order matches the rest of the pipeline
+_COLUMNS = ('hr', 'bp_sys', 'bp_dia', 'spo2', 'rr', 'temp')
+
+class PatientRing:
+    """Columnar buffer of a patient's last MAX_WINDOW_S seconds of readings.
+
+    One timestamp array plus one (capacity, 6) value matrix replaces the
+    previous three deques of per-reading dicts: a reading is appended once
+    (7 scalar stores) instead of allocated three times, and any window size
+    is just a searchsorted cutoff plus a slice-mean over the same storage.
+    """
+
+    MAX_WINDOW_S = 600 # Largest window we ever serve (10m)
+
+    def __init__(self, capacity=1024):
+        self._ts = np.empty(capacity, dtype=np.float64)
+        self._vals = np.empty((capacity, len(_COLUMNS)), dtype=np.float32)
+        self._head = 0 # Oldest live entry
+        self._tail = 0 # One past newest
+
+    def append(self, ts: float, values):
+        if self._tail == len(self._ts):
+            self._compact_or_grow()
+        self._ts[self._tail] = ts
+        self._vals[self._tail] = values
+        self._tail += 1
+        # Drop everything older than the max window; smaller windows are
+        # lazy sub-slices so nothing else is touched per event. The cutoff
+        # is a single float computed once per append - no datetime math in
+        # the loop - and the searchsorted only runs once the oldest entry
+        # has actually aged out; until then the append costs one compare.
+        cutoff = ts - self.MAX_WINDOW_S
+        if self._ts[self._head] < cutoff:
+            self._head += int(np.searchsorted(self._ts[self._head:self._tail], cutoff))
+
+    def _compact_or_grow(self):
+        live = self._tail - self._head
+        if live > len(self._ts) // 2:
+            # Mostly live data: double capacity
+            new_cap = len(self._ts) * 2
+            ts = np.empty(new_cap, dtype=np.float64)
+            vals = np.empty((new_cap, len(_COLUMNS)), dtype=np.float32)
+            ts[:live] = self._ts[self._head:self._tail]
+            vals[:live] = self._vals[self._head:self._tail]
+            self._ts, self._vals = ts, vals
+        else:
+            # Mostly pruned: slide the live region back to the front
+            self._ts[:live] = self._ts[self._head:self._tail]
+            self._vals[:live] = self._vals[self._head:self._tail]
+        self._head, self._tail = 0, live
+
+    def aggregates(self, window_s):
+        if self._head == self._tail:
             return None
-        
-        # Calculate stats for numeric fields
-        count = len(self.events)
-        
+
+        end_ts = self._ts[self._tail - 1]
+        lo = self._head + int(np.searchsorted(
+            self._ts[self._head:self._tail], end_ts - window_s
+        ))
+        count = self._tail - lo
+        vals = self._vals[lo:self._tail]
+
         # We focus on a few key metrics for summaries
-        hrs = [e[1]['hr'] for e in self.events]
-        spo2s = [e[1]['spo2'] for e in self.events]
-        temps = [e[1]['temp'] for e in self.events]
-        
         return {
-            "window_size_s": self.size_seconds,
+            "window_size_s": window_s,
             "count": count,
-            "end_time": self.events[-1][0],
-            "avg_hr": round(float(np.mean(hrs)), 2),
-            "avg_spo2": round(float(np.mean(spo2s)), 2),
-            "avg_temp": round(float(np.mean(temps)), 2)
+            "end_time": float(end_ts),
+            "avg_hr": round(float(vals[:, 0].mean()), 2),
+            "avg_spo2": round(float(vals[:, 3].mean()), 2),
+            "avg_temp": round(float(vals[:, 5].mean()), 2)
         }
 
+class SlidingWindow:
+    """View of one window size over a shared PatientRing."""
+    def __init__(self, ring: PatientRing, size_seconds):
+        self.ring = ring
+        self.size_seconds = size_seconds
+
+    def get_aggregates(self):
+        return self.ring.aggregates(self.size_seconds)
+
 class PatientStateManager:
     """Manages windows for a single patient."""
     def __init__(self, patient_id):
         self.patient_id = patient_id
-        # Windows: 30s, 2m, 10m
-        self.w_30s = SlidingWindow(30)
-        self.w_2m = SlidingWindow(120)
-        self.w_10m = SlidingWindow(600)
-    
+        self.ring = PatientRing()
+        # Windows: 30s, 2m, 10m - all views over the same ring
+        self.w_30s = SlidingWindow(self.ring, 30)
+        self.w_2m = SlidingWindow(self.ring, 120)
+        self.w_10m = SlidingWindow(self.ring, 600)
+
     def add_reading(self, reading: dict):
         # Expects reading to have 'timestamp' (datetime obj) and values
         ts = reading['timestamp']
-        self.w_30s.add_event(ts, reading)
-        self.w_2m.add_event(ts, reading)
-        self.w_10m.add_event(ts, reading)
-    
+        if isinstance(ts, datetime):
+            ts = ts.timestamp()
+        self.ring.append(ts, tuple(reading[c] for c in _COLUMNS))
+
+    def add_values(self, ts: float, values):
+        # Hot-path variant: epoch seconds plus a _COLUMNS-ordered tuple,
+        # no dict to build or unpack
+        self.ring.append(ts, values)
+
     def get_summaries(self):
         return [
             self.w_30s.get_aggregates(),